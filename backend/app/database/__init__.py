@@ -1,3 +1,3 @@
-from .db import engine, create_db_and_tables, get_session
+from .db import engine, AsyncSessionLocal, ScopedSession, create_db_and_tables, get_session
 
-__all__ = ["engine", "create_db_and_tables", "get_session"]
+__all__ = ["engine", "AsyncSessionLocal", "ScopedSession", "create_db_and_tables", "get_session"]
@@ -1,24 +1,55 @@
-from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session
+from sqlalchemy.pool import NullPool
+from asyncio import current_task
 import os
 
-# Database URL - using SQLite for simplicity, can be changed to PostgreSQL/MySQL
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./todo.db")
+# Database URL - using SQLite (aiosqlite) for simplicity, can be changed to PostgreSQL (asyncpg)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./todo.db")
+
+# Connection pool settings (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+# Set when an external pooler such as PgBouncer owns the connections
+DB_NULL_POOL = os.getenv("DB_NULL_POOL", "false").lower() == "true"
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+
+def _engine_options() -> dict:
+    """Build engine keyword arguments for the configured database"""
+    if "sqlite" in DATABASE_URL:
+        return {"connect_args": {"check_same_thread": False}}
+    if DB_NULL_POOL:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
 
 # Create engine
-engine = create_engine(
-    DATABASE_URL,
-    echo=True,  # Set to False in production
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_async_engine(DATABASE_URL, echo=DB_ECHO, **_engine_options())
+
+# Session factory
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+# Session registry scoped to the asyncio task serving the request.
+# SessionScopeMiddleware calls ScopedSession.remove() once the response is sent.
+ScopedSession = async_scoped_session(AsyncSessionLocal, scopefunc=current_task)
 
 
-def create_db_and_tables():
+async def create_db_and_tables():
     """Create database tables"""
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
 
-def get_session() -> Generator[Session, None, None]:
-    """Dependency to get database session"""
-    with Session(engine) as session:
-        yield session
+async def get_session() -> AsyncSession:
+    """Dependency to get the request-scoped database session"""
+    return ScopedSession()
@@ -1,20 +1,78 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+import os
 import uvicorn
 
-from app.database import create_db_and_tables
+from app.database import ScopedSession, create_db_and_tables, engine
 from app.routes import auth_router, todo_router
+from app.services.auth import AuthService
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
-    create_db_and_tables()
+    await create_db_and_tables()
     yield
-    # Shutdown (if needed in future)
+    # Shutdown: close pooled connections (aiosqlite runs a non-daemon thread per connection)
+    await engine.dispose()
+
+
+class SessionScopeMiddleware:
+    """Release the request-scoped database session after the response is sent"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await ScopedSession.remove()
+
+
+class AuthMiddleware:
+    """Resolve the bearer token once per request and attach the user to request.state.
+    
+    Never rejects a request itself: routes decide whether a user is required through the
+    current_user / get_active_user dependencies.
+    """
+
+    PREFIXES = ("/auth", "/todos")
+    PUBLIC_PATHS = frozenset({"/auth/login", "/auth/login/json", "/auth/register"})
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope.get("path", "")
+        if scope["type"] == "http" and path.startswith(self.PREFIXES) and path not in self.PUBLIC_PATHS:
+            user = await self._resolve_user(scope)
+            state = scope.setdefault("state", {})
+            state["user"] = user
+            state["user_id"] = user.id if user is not None else None
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _resolve_user(scope: Scope):
+        scheme, token = get_authorization_scheme_param(Headers(scope=scope).get("authorization"))
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            token_data = AuthService.verify_token(token)
+        except HTTPException:
+            return None
+        # Same task-scoped session the endpoint will get from get_session
+        return await AuthService.get_user_snapshot(ScopedSession(), token, token_data.username)
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -23,26 +81,26 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# Attach the authenticated user (runs inside CORS and the session scope)
+app.add_middleware(AuthMiddleware)
+
 # Add CORS middleware
+# Explicit lists plus a long max_age let browsers cache preflight responses
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure properly in production
+    allow_origins=os.getenv("CORS_ORIGINS", "http://localhost:5173").split(","),
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
-
-# Global exception handler
-@app.exception_handler(HTTPException)
-async def http_exception_handler(request, exc):
-    return JSONResponse(
-        status_code=exc.status_code,
-        content={"detail": exc.detail}
-    )
+# Close the scoped session once per request
+app.add_middleware(SessionScopeMiddleware)
 
 
 # Include routers (blueprints)
@@ -78,10 +136,23 @@ async def health_check():
 
 # Run the application
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+    if os.getenv("ENV", "dev") == "dev":
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
+    else:
+        # Production: 2 * cores + 1 workers on uvloop + httptools, no access log
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() * 2 + 1)),
+            loop="uvloop",
+            http="httptools",
+            access_log=False,
+            log_level="warning"
+        )
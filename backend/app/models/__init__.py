@@ -1,10 +1,11 @@
-from .base import BaseModel, TimestampMixin
+from .base import BaseModel, TimestampMixin, UUIDType
 from .user import User, UserCreate, UserRead, UserUpdate
 from .todo import Todo, TodoCreate, TodoRead, TodoUpdate, TodoStatus, TodoPriority
 
 __all__ = [
     "BaseModel",
     "TimestampMixin",
+    "UUIDType",
     "User",
     "UserCreate", 
     "UserRead",
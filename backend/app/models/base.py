@@ -1,15 +1,74 @@
+from sqlalchemy import BINARY, DateTime
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import TypeDecorator
 from sqlmodel import SQLModel, Field
 from datetime import datetime
 from typing import Optional
 from uuid import UUID, uuid4
 
 
+class UUIDType(TypeDecorator):
+    """UUID column stored natively on PostgreSQL and as 16 raw bytes elsewhere"""
+    impl = BINARY(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(PG_UUID(as_uuid=True))
+        return dialect.type_descriptor(BINARY(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        if not isinstance(value, UUID):
+            value = UUID(str(value))
+        return value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        return UUID(bytes=value)
+
+
+class utcnow(FunctionElement):
+    """Current timestamp generated by the database"""
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _compile_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "sqlite")
+def _compile_utcnow_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has whole-second precision and a different text format from
+    # the one SQLAlchemy binds datetimes in, so stored values would not compare
+    # correctly against bound parameters. Emit SQLAlchemy's format with milliseconds.
+    return "(strftime('%Y-%m-%d %H:%M:%f000', 'now'))"
+
+
 class TimestampMixin(SQLModel):
-    """Mixin for common timestamp fields"""
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: Optional[datetime] = Field(default=None)
+    """Mixin for common timestamp fields (generated by the database)"""
+    created_at: datetime = Field(
+        default=None,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": utcnow()},
+    )
+    updated_at: Optional[datetime] = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"onupdate": utcnow()},
+    )
 
 
 class BaseModel(TimestampMixin):
     """Base model with common fields"""
-    id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True)
+    # Fetch server-generated timestamps with RETURNING on INSERT/UPDATE, not a later SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
+    id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True, sa_type=UUIDType)
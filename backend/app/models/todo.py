@@ -1,9 +1,10 @@
+from sqlalchemy import DDL, Index, event, text
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, TYPE_CHECKING
 from datetime import datetime
 from uuid import UUID
 from enum import Enum
-from .base import BaseModel
+from .base import BaseModel, UUIDType
 
 if TYPE_CHECKING:
     from .user import User
@@ -38,14 +39,56 @@ class TodoBase(SQLModel):
 class Todo(TodoBase, BaseModel, table=True):
     """Todo table model"""
     __tablename__ = "todos"
+    __table_args__ = (
+        # Every query is scoped to one owner; these cover the hot filters and sorts
+        # List pages: walk the owner's todos newest first and stop after the page
+        Index("ix_todos_owner_created", "owner_id", text("created_at DESC"), text("id DESC")),
+        Index("ix_todos_owner_due", "owner_id", "due_date"),
+        Index("ix_todos_owner_status", "owner_id", "status"),
+        # Overdue / due-soon: is_completed equality, then a due_date range scan
+        Index("ix_todos_owner_completed_due", "owner_id", "is_completed", "due_date"),
+    )
     
     # Foreign key to user
-    owner_id: UUID = Field(foreign_key="users.id")
+    owner_id: UUID = Field(foreign_key="users.id", sa_type=UUIDType)
     
     # Relationships
     owner: "User" = Relationship(back_populates="todos")
 
 
+# Indexes behind the title/description substring search, created with the table.
+# PostgreSQL: trigram GIN index, used by ILIKE '%term%'.
+# SQLite: external-content FTS5 table with the trigram tokenizer, kept in sync by
+# triggers. It is keyed on todos.rowid, so run
+# INSERT INTO todos_fts(todos_fts) VALUES('rebuild') after a VACUUM.
+_SEARCH_INDEX_DDL = {
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_todos_search_trgm ON todos "
+        "USING gin (title gin_trgm_ops, description gin_trgm_ops)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+        "title, description, content='todos', content_rowid='rowid', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_ai AFTER INSERT ON todos BEGIN "
+        "INSERT INTO todos_fts(rowid, title, description) "
+        "VALUES (new.rowid, new.title, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_ad AFTER DELETE ON todos BEGIN "
+        "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+        "VALUES ('delete', old.rowid, old.title, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN "
+        "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+        "VALUES ('delete', old.rowid, old.title, old.description); "
+        "INSERT INTO todos_fts(rowid, title, description) "
+        "VALUES (new.rowid, new.title, new.description); END",
+    ],
+}
+
+for _dialect, _statements in _SEARCH_INDEX_DDL.items():
+    for _statement in _statements:
+        event.listen(Todo.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+
 class TodoCreate(TodoBase):
     """Todo creation schema"""
     pass
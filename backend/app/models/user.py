@@ -21,6 +21,8 @@ class User(UserBase, BaseModel, table=True):
     __tablename__ = "users"
     
     hashed_password: str
+    # Bumped on every todo write; used to validate cached stats responses
+    todos_version: int = Field(default=0)
     
     # Relationships
     todos: List["Todo"] = Relationship(back_populates="owner")
@@ -1,11 +1,13 @@
 from datetime import timedelta
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session
+from typing import Annotated, Optional
+from uuid import UUID
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Security, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.database import get_session
-from app.services.auth import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES, oauth2_scheme
+from app.services.auth import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES, credentials_exception
 from app.models.user import User, UserCreate
 from app.schemas.auth import (
     Token,
@@ -20,34 +22,57 @@ from app.schemas.auth import (
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
-# Dependency to get current user
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    session: Annotated[Session, Depends(get_session)]
-) -> User:
-    """Get current authenticated user"""
-    token_data = AuthService.verify_token(token)
-    user = AuthService.get_user_by_username(session, token_data.username)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return user
+def _to_profile(user: User) -> UserProfile:
+    """Build a profile response from a trusted ORM row without re-running validation"""
+    return UserProfile.model_construct(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        full_name=user.full_name,
+        is_active=user.is_active,
+        created_at=user.created_at,
+        updated_at=user.updated_at,
+    )
 
 
-async def get_active_user(current_user: Annotated[User, Depends(get_current_user)]) -> User:
-    """Get current active user"""
-    if not current_user.is_active:
+def not_modified(request: Request, response: Response, *parts) -> Optional[Response]:
+    """Tag the response with an ETag built from parts; return a 304 if the client already has it"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+# Dependencies reading the user attached by AuthMiddleware
+def current_user(
+    request: Request,
+    # AuthMiddleware already resolved the token; this only documents the scheme in OpenAPI
+    _: Annotated[str | None, Security(OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False))],
+) -> UUID:
+    """Get the ID of the current active user"""
+    user = getattr(request.state, "user", None)
+    if user is None:
+        raise credentials_exception()
+    if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
+    return request.state.user_id
+
+
+async def get_active_user(
+    request: Request,
+    user_id: Annotated[UUID, Depends(current_user)],
+    session: Annotated[AsyncSession, Depends(get_session)]
+) -> User:
+    """Get the full current active user row, for endpoints that need its fields"""
+    return await AuthService.attach_user(session, request.state.user)
 
 
 @router.post("/register", response_model=UserProfile, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: RegisterRequest,
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[AsyncSession, Depends(get_session)]
 ):
     """Register a new user"""
     user_create = UserCreate(
@@ -57,17 +82,17 @@ async def register(
         full_name=user_data.full_name
     )
     
-    user = AuthService.create_user(session, user_create)
-    return UserProfile.model_validate(user)
+    user = await AuthService.create_user(session, user_create)
+    return _to_profile(user)
 
 
 @router.post("/login", response_model=Token)
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[AsyncSession, Depends(get_session)]
 ):
     """Login with username and password"""
-    user = AuthService.authenticate_user(session, form_data.username, form_data.password)
+    user = await AuthService.authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,7 +102,7 @@ async def login(
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = AuthService.create_access_token(
-        data={"sub": user.username, "user_id": str(user.id)},
+        data={"sub": user.username, "user_id": user.id},
         expires_delta=access_token_expires
     )
     
@@ -91,10 +116,10 @@ async def login(
 @router.post("/login/json", response_model=Token)
 async def login_json(
     login_data: LoginRequest,
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[AsyncSession, Depends(get_session)]
 ):
     """Login with JSON payload"""
-    user = AuthService.authenticate_user(session, login_data.username, login_data.password)
+    user = await AuthService.authenticate_user(session, login_data.username, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,7 +128,7 @@ async def login_json(
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = AuthService.create_access_token(
-        data={"sub": user.username, "user_id": str(user.id)},
+        data={"sub": user.username, "user_id": user.id},
         expires_delta=access_token_expires
     )
     
@@ -116,36 +141,43 @@ async def login_json(
 
 @router.get("/me", response_model=UserProfile)
 async def get_current_user_profile(
-    current_user: Annotated[User, Depends(get_active_user)]
+    request: Request,
+    response: Response,
+    user_id: Annotated[UUID, Depends(current_user)]
 ):
     """Get current user profile"""
-    return UserProfile.model_validate(current_user)
+    # The cached snapshot is enough for a read; no need to attach it to a session
+    user = request.state.user
+    cached = not_modified(request, response, user.id, user.updated_at)
+    if cached is not None:
+        return cached
+    return _to_profile(user)
 
 
 @router.put("/me", response_model=UserProfile)
 async def update_profile(
     profile_data: UpdateProfileRequest,
     current_user: Annotated[User, Depends(get_active_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[AsyncSession, Depends(get_session)]
 ):
     """Update current user profile"""
-    updated_user = AuthService.update_user_profile(
+    updated_user = await AuthService.update_user_profile(
         session=session,
         user=current_user,
         email=profile_data.email,
         full_name=profile_data.full_name
     )
-    return UserProfile.model_validate(updated_user)
+    return _to_profile(updated_user)
 
 
 @router.post("/change-password", status_code=status.HTTP_200_OK)
 async def change_password(
     password_data: ChangePasswordRequest,
     current_user: Annotated[User, Depends(get_active_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[AsyncSession, Depends(get_session)]
 ):
     """Change user password"""
-    AuthService.change_password(
+    await AuthService.change_password(
         session=session,
         user=current_user,
         current_password=password_data.current_password,
@@ -161,7 +193,7 @@ async def refresh_token(
     """Refresh access token"""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = AuthService.create_access_token(
-        data={"sub": current_user.username, "user_id": str(current_user.id)},
+        data={"sub": current_user.username, "user_id": current_user.id},
         expires_delta=access_token_expires
     )
     
@@ -15,6 +15,7 @@ from .todo import (
     TodoListResponse,
     TodoFilterParams,
     TodoStatsResponse,
+    TodoDashboardResponse,
 )
 
 __all__ = [
@@ -33,4 +34,5 @@ __all__ = [
     "TodoListResponse",
     "TodoFilterParams",
     "TodoStatsResponse",
+    "TodoDashboardResponse",
 ]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import ClassVar, Optional, List, Tuple
 from datetime import datetime
 from uuid import UUID
 from app.models.todo import TodoStatus, TodoPriority
@@ -25,6 +25,9 @@ class TodoUpdateRequest(BaseModel):
 
 class TodoResponse(BaseModel):
     """Todo response"""
+    # Relationships the service must eager-load to build this response
+    eager_relations: ClassVar[Tuple[str, ...]] = ()
+
     id: UUID
     title: str
     description: Optional[str]
@@ -43,11 +46,12 @@ class TodoResponse(BaseModel):
 class TodoListResponse(BaseModel):
     """Todo list response with pagination"""
     todos: List[TodoResponse]
-    total: int
+    total: Optional[int] = None  # Not counted on cursor pages unless include_total is set
     page: int
     per_page: int
     has_next: bool
     has_prev: bool
+    next_cursor: Optional[str] = None  # Pass as `cursor` to fetch the following page
 
 
 class TodoFilterParams(BaseModel):
@@ -60,6 +64,8 @@ class TodoFilterParams(BaseModel):
     due_after: Optional[datetime] = None
     page: int = Field(1, ge=1)
     per_page: int = Field(10, ge=1, le=100)
+    cursor: Optional[Tuple[datetime, UUID]] = None  # Decoded keyset cursor; takes precedence over page
+    include_total: bool = False  # Also count the total on cursor pages
 
 
 class TodoStatsResponse(BaseModel):
@@ -70,3 +76,10 @@ class TodoStatsResponse(BaseModel):
     overdue_todos: int
     todos_by_priority: dict
     todos_by_status: dict
+
+
+class TodoDashboardResponse(BaseModel):
+    """Dashboard payload: stats plus overdue and due-soon todos"""
+    stats: TodoStatsResponse
+    overdue: List[TodoResponse]
+    due_soon: List[TodoResponse]
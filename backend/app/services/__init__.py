@@ -1,9 +1,8 @@
-from .auth import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES, oauth2_scheme
+from .auth import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES
 from .todo import TodoService
 
 __all__ = [
     "AuthService",
     "ACCESS_TOKEN_EXPIRE_MINUTES",
-    "oauth2_scheme", 
     "TodoService",
 ]
@@ -1,15 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 from uuid import UUID
 from fastapi import HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from cachetools import TTLCache
+from sqlalchemy import lambda_stmt
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import jwt
+from jwt import PyJWTError as JWTError
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 from app.models.user import User, UserCreate
 from app.schemas.auth import TokenData
+import asyncio
+import base64
+import bcrypt
 import os
+import time
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -17,27 +28,102 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# New hashes use argon2id; bcrypt hashes from older accounts still verify and are
+# upgraded on the next successful login.
+_argon2 = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+# Verified against when the username does not exist, so unknown and known users cost the same
+_DUMMY_HASH = _argon2.hash("dummy-password")
+
+# Password hashing is CPU-bound (~100ms+ per call) and must not block the event loop.
+# argon2 and bcrypt release the GIL while hashing, so a thread pool spreads the work across cores.
+_password_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password-hash")
+
+T = TypeVar("T")
+
+
+async def _run_in_password_pool(func: Callable[..., T], *args) -> T:
+    """Run a blocking password hashing function in the dedicated pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, func, *args)
+
+# Detached snapshots of authenticated users, keyed by bearer token
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Verified token payloads keyed by the full token string: (TokenData, exp timestamp).
+# A short TTL keeps the cache from outliving revocations for long; the exp check
+# in verify_token still applies on every hit.
+_token_cache: TTLCache = TTLCache(maxsize=50_000, ttl=60)
+
+_CREDENTIALS_HEADERS = {"WWW-Authenticate": "Bearer"}
+
+
+def _is_argon2(hashed_password: str) -> bool:
+    return hashed_password.startswith("$argon2")
+
+
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+    """Blocking argon2/bcrypt verify; run through the password pool"""
+    if _is_argon2(hashed_password):
+        try:
+            return _argon2.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+    # Legacy bcrypt hash; bcrypt only uses the first 72 bytes, as passlib did
+    return bcrypt.checkpw(plain_password.encode()[:72], hashed_password.encode())
+
+
+def _hash_password(password: str) -> str:
+    """Blocking argon2id hash; run through the password pool"""
+    return _argon2.hash(password)
+
+
+def _encode_user_id(user_id: UUID) -> str:
+    """Compact token claim: unpadded base64url of the 16 raw UUID bytes"""
+    return base64.urlsafe_b64encode(user_id.bytes).rstrip(b"=").decode()
+
+
+def _decode_user_id(claim: Optional[str]) -> Optional[UUID]:
+    """Inverse of _encode_user_id; still accepts the hex form issued by older tokens"""
+    if not claim:
+        return None
+    if len(claim) == 22:
+        return UUID(bytes=base64.urlsafe_b64decode(claim + "=="))
+    return UUID(claim)
+
+
+def credentials_exception() -> HTTPException:
+    """401 raised for any invalid or expired token"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers=_CREDENTIALS_HEADERS,
+    )
 
 
 class AuthService:
     """Authentication service"""
     
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """Verify a password against its hash"""
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash without blocking the event loop"""
+        return await _run_in_password_pool(_check_password, plain_password, hashed_password)
+    
+    @staticmethod
+    async def get_password_hash(password: str) -> str:
+        """Hash a password without blocking the event loop"""
+        return await _run_in_password_pool(_hash_password, password)
     
     @staticmethod
-    def get_password_hash(password: str) -> str:
-        """Hash a password"""
-        return pwd_context.hash(password)
+    def password_needs_rehash(hashed_password: str) -> bool:
+        """Whether a stored hash predates the current argon2id parameters"""
+        return not _is_argon2(hashed_password) or _argon2.check_needs_rehash(hashed_password)
     
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
         """Create JWT access token"""
         to_encode = data.copy()
+        if isinstance(to_encode.get("user_id"), UUID):
+            to_encode["user_id"] = _encode_user_id(to_encode["user_id"])
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
@@ -50,71 +136,112 @@ class AuthService:
     @staticmethod
     def verify_token(token: str) -> TokenData:
         """Verify JWT token and return token data"""
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        cached = _token_cache.get(token)
+        if cached is not None:
+            token_data, expires_at = cached
+            if expires_at > time.time():
+                return token_data
+            _token_cache.pop(token, None)
         
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            user_id: str = payload.get("user_id")
-            
-            if username is None:
-                raise credentials_exception
-                
-            token_data = TokenData(username=username, user_id=UUID(user_id) if user_id else None)
-            return token_data
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp"]})
         except JWTError:
-            raise credentials_exception
+            raise credentials_exception()
+        
+        username = payload.get("sub")
+        if not isinstance(username, str):
+            raise credentials_exception()
+        try:
+            user_id = _decode_user_id(payload.get("user_id"))
+        except (TypeError, ValueError):
+            raise credentials_exception()
+        
+        # Both fields are already validated; skip a second pydantic pass
+        token_data = TokenData.model_construct(username=username, user_id=user_id)
+        _token_cache[token] = (token_data, payload["exp"])
+        return token_data
     
     @staticmethod
-    def get_user_by_username(session: Session, username: str) -> Optional[User]:
+    async def get_user_by_username(session: AsyncSession, username: str) -> Optional[User]:
         """Get user by username"""
-        statement = select(User).where(User.username == username)
-        return session.exec(statement).first()
+        statement = lambda_stmt(lambda: select(User).where(User.username == username))
+        return (await session.exec(statement)).scalars().first()
     
     @staticmethod
-    def get_user_by_email(session: Session, email: str) -> Optional[User]:
+    async def get_user_by_email(session: AsyncSession, email: str) -> Optional[User]:
         """Get user by email"""
-        statement = select(User).where(User.email == email)
-        return session.exec(statement).first()
+        statement = lambda_stmt(lambda: select(User).where(User.email == email))
+        return (await session.exec(statement)).scalars().first()
     
     @staticmethod
-    def get_user_by_id(session: Session, user_id: UUID) -> Optional[User]:
+    async def get_user_by_id(session: AsyncSession, user_id: UUID) -> Optional[User]:
         """Get user by ID"""
-        statement = select(User).where(User.id == user_id)
-        return session.exec(statement).first()
+        # Identity-map hit when the user is already in this session
+        return await session.get(User, user_id)
     
     @staticmethod
-    def authenticate_user(session: Session, username: str, password: str) -> Optional[User]:
-        """Authenticate user with username and password"""
-        user = AuthService.get_user_by_username(session, username)
-        if not user:
+    async def get_user_snapshot(session: AsyncSession, token: str, username: str) -> Optional[User]:
+        """Get a detached snapshot of the user a verified token belongs to, querying only on cache misses.
+        
+        The snapshot is shared between requests and must not be modified; use attach_user for a
+        session-bound copy.
+        """
+        cached = _user_cache.get(token)
+        if cached is not None:
+            return cached
+        
+        user = await AuthService.get_user_by_username(session, username)
+        if user is None:
             return None
-        if not AuthService.verify_password(password, user.hashed_password):
+        snapshot = User(**user.model_dump())
+        make_transient_to_detached(snapshot)
+        _user_cache[token] = snapshot
+        return snapshot
+    
+    @staticmethod
+    async def attach_user(session: AsyncSession, snapshot: User) -> User:
+        """Attach a private copy of a cached user snapshot to this session without emitting a SELECT"""
+        return await session.merge(snapshot, load=False)
+    
+    @staticmethod
+    def invalidate_user_cache(user_id: UUID) -> None:
+        """Drop cached snapshots of a user after their row changes"""
+        for token, cached in list(_user_cache.items()):
+            if cached.id == user_id:
+                _user_cache.pop(token, None)
+    
+    @staticmethod
+    async def authenticate_user(session: AsyncSession, username: str, password: str) -> Optional[User]:
+        """Authenticate user with username and password"""
+        user = await AuthService.get_user_by_username(session, username)
+        target_hash = user.hashed_password if user else _DUMMY_HASH
+        password_ok = await AuthService.verify_password(password, target_hash)
+        if user is None or not password_ok:
             return None
+        
+        # Transparently upgrade legacy bcrypt hashes now that the plain password is known
+        if AuthService.password_needs_rehash(user.hashed_password):
+            user.hashed_password = await AuthService.get_password_hash(password)
+            session.add(user)
+            await session.commit()
+            AuthService.invalidate_user_cache(user.id)
         return user
     
     @staticmethod
-    def create_user(session: Session, user_create: UserCreate) -> User:
+    async def create_user(session: AsyncSession, user_create: UserCreate) -> User:
         """Create a new user"""
-        # Check if user already exists
-        if AuthService.get_user_by_username(session, user_create.username):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already registered"
-            )
-        
-        if AuthService.get_user_by_email(session, user_create.email):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
+        # Check username and email in one round-trip
+        username, email = user_create.username, user_create.email
+        existing = (await session.exec(
+            lambda_stmt(lambda: select(User).where(or_(User.username == username, User.email == email)))
+        )).scalars().first()
+        if existing is not None:
+            detail = ("Username already registered" if existing.username == user_create.username
+                      else "Email already registered")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
         
         # Create user
-        hashed_password = AuthService.get_password_hash(user_create.password)
+        hashed_password = await AuthService.get_password_hash(user_create.password)
         db_user = User(
             username=user_create.username,
             email=user_create.email,
@@ -124,32 +251,39 @@ class AuthService:
         )
         
         session.add(db_user)
-        session.commit()
-        session.refresh(db_user)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # A concurrent registration claimed the username or email after the check
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username or email already registered"
+            )
         return db_user
     
     @staticmethod
-    def change_password(session: Session, user: User, current_password: str, new_password: str) -> bool:
+    async def change_password(session: AsyncSession, user: User, current_password: str, new_password: str) -> bool:
         """Change user password"""
-        if not AuthService.verify_password(current_password, user.hashed_password):
+        if not await AuthService.verify_password(current_password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect current password"
             )
         
-        user.hashed_password = AuthService.get_password_hash(new_password)
-        user.updated_at = datetime.utcnow()
+        user.hashed_password = await AuthService.get_password_hash(new_password)
         session.add(user)
-        session.commit()
+        await session.commit()
+        AuthService.invalidate_user_cache(user.id)
         return True
     
     @staticmethod
-    def update_user_profile(session: Session, user: User, email: Optional[str] = None, 
+    async def update_user_profile(session: AsyncSession, user: User, email: Optional[str] = None, 
                           full_name: Optional[str] = None) -> User:
         """Update user profile"""
         if email and email != user.email:
             # Check if email is already taken
-            if AuthService.get_user_by_email(session, email):
+            if await AuthService.get_user_by_email(session, email):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already registered"
@@ -159,8 +293,7 @@ class AuthService:
         if full_name is not None:
             user.full_name = full_name
         
-        user.updated_at = datetime.utcnow()
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        AuthService.invalidate_user_cache(user.id)
         return user
@@ -1,17 +1,113 @@
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 from uuid import UUID
-from sqlmodel import Session, select, func, and_, or_
+from cachetools import TTLCache
+from sqlalchemy import Row, case, lambda_stmt, literal, literal_column, table, update
+from sqlalchemy.orm import selectinload, raiseload
+from sqlmodel import select, func, and_, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models.todo import Todo, TodoCreate, TodoUpdate, TodoStatus, TodoPriority
-from app.schemas.todo import TodoFilterParams, TodoStatsResponse
+from app.models.user import User
+from app.schemas.todo import TodoFilterParams, TodoStatsResponse, TodoResponse
+import base64
+import binascii
+
+
+def _apply_search(statement, dialect_name: str, term: str):
+    """Substring match on title/description that can use the dialect's search index"""
+    if dialect_name == "postgresql":
+        pattern = f"%{term}%"
+        return statement + (lambda s: s.where(or_(Todo.title.ilike(pattern), Todo.description.ilike(pattern))))
+    if dialect_name == "sqlite" and len(term) >= 3:
+        # Trigram FTS5 lookup; a quoted phrase matches as a substring
+        phrase = '"' + term.replace('"', '""') + '"'
+        return statement + (lambda s: s.where(
+            literal_column("todos.rowid").in_(
+                select(literal_column("rowid"))
+                .select_from(table("todos_fts"))
+                .where(literal_column("todos_fts").op("MATCH")(phrase))
+            )
+        ))
+    # Terms shorter than a trigram fall back to a scan
+    return statement + (lambda s: s.where(or_(Todo.title.contains(term), Todo.description.contains(term))))
+
+
+def _apply_filters(statement, dialect_name: str, owner_id: UUID, filters: TodoFilterParams):
+    """Append one cached lambda per active filter, so each filter combination compiles once"""
+    statement += lambda s: s.where(Todo.owner_id == owner_id)
+    
+    status, priority, is_completed = filters.status, filters.priority, filters.is_completed
+    due_before, due_after = filters.due_before, filters.due_after
+    
+    if status:
+        statement += lambda s: s.where(Todo.status == status)
+    
+    if priority:
+        statement += lambda s: s.where(Todo.priority == priority)
+    
+    if is_completed is not None:
+        statement += lambda s: s.where(Todo.is_completed == is_completed)
+    
+    if filters.search:
+        statement = _apply_search(statement, dialect_name, filters.search)
+    
+    if due_before:
+        statement += lambda s: s.where(Todo.due_date <= due_before)
+    
+    if due_after:
+        statement += lambda s: s.where(Todo.due_date >= due_after)
+    
+    return statement
+
+
+# Columns rendered by TodoResponse, selected directly for list pages
+_LIST_COLUMNS = tuple(getattr(Todo, name) for name in TodoResponse.model_fields)
+
+
+def _load_relations(statement, relations: Sequence[str]):
+    """Eager-load the given Todo relationships and forbid lazy loads of the rest"""
+    options = [selectinload(getattr(Todo, name)) for name in relations]
+    return statement.add_criteria(lambda s: s.options(*options, raiseload("*")), track_on=[",".join(relations)])
+
+
+# Per-owner stats: (todos_version, TodoStatsResponse). Entries are validated against the
+# stored version, so writes made by other workers are seen too; the TTL bounds how stale
+# the time-dependent overdue count can get.
+_stats_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+
+async def _bump_todos_version(session: AsyncSession, owner_id: UUID) -> None:
+    """Invalidate caches and ETags derived from the owner's todos; committed with the write itself"""
+    _stats_cache.pop(owner_id, None)
+    await session.exec(
+        update(User)
+        .where(User.id == owner_id)
+        # Keep updated_at untouched: it tracks profile changes, not todo writes
+        .values(todos_version=User.todos_version + 1, updated_at=User.updated_at)
+    )
+
+
+def encode_cursor(todo: Todo) -> str:
+    """Opaque keyset cursor pointing just past the given todo"""
+    raw = f"{todo.created_at.isoformat()}|{todo.id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        created_at, todo_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(todo_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
 
 
 class TodoService:
     """Todo service for CRUD operations"""
     
     @staticmethod
-    def create_todo(session: Session, todo_data: TodoCreate, owner_id: UUID) -> Todo:
+    async def create_todo(session: AsyncSession, todo_data: TodoCreate, owner_id: UUID) -> Todo:
         """Create a new todo"""
         db_todo = Todo(
             **todo_data.model_dump(),
@@ -19,198 +115,240 @@ class TodoService:
         )
         
         session.add(db_todo)
-        session.commit()
-        session.refresh(db_todo)
+        await _bump_todos_version(session, owner_id)
+        await session.commit()
         return db_todo
     
     @staticmethod
-    def get_todo_by_id(session: Session, todo_id: UUID, owner_id: UUID) -> Optional[Todo]:
+    async def get_todo_by_id(session: AsyncSession, todo_id: UUID, owner_id: UUID) -> Optional[Todo]:
         """Get todo by ID (only if owned by user)"""
-        statement = select(Todo).where(
-            and_(Todo.id == todo_id, Todo.owner_id == owner_id)
-        )
-        return session.exec(statement).first()
+        # Primary-key lookup goes through the identity map; ownership is checked in Python
+        todo = await session.get(Todo, todo_id)
+        if todo is None or todo.owner_id != owner_id:
+            return None
+        return todo
     
     @staticmethod
-    def get_todos_with_filters(
-        session: Session, 
+    async def get_todos_with_filters(
+        session: AsyncSession, 
         owner_id: UUID, 
-        filters: TodoFilterParams
-    ) -> Tuple[List[Todo], int]:
-        """Get todos with filtering and pagination"""
-        # Base query
-        statement = select(Todo).where(Todo.owner_id == owner_id)
-        count_statement = select(func.count(Todo.id)).where(Todo.owner_id == owner_id)
-        
-        # Apply filters
-        conditions = []
-        
-        if filters.status:
-            conditions.append(Todo.status == filters.status)
+        filters: TodoFilterParams,
+        relations: Sequence[str] = TodoResponse.eager_relations
+    ) -> Tuple[Union[Sequence[Row], List[Todo]], Optional[int], bool]:
+        """Get todos with filtering and pagination.
         
-        if filters.priority:
-            conditions.append(Todo.priority == filters.priority)
+        Pages by cursor (keyset) when filters.cursor is set, otherwise by page number.
+        Returns the todos, the total matching count and whether another page follows;
+        on cursor pages the total is only counted when filters.include_total is set.
+        Without relations to load, the todos are plain column rows exposing the same
+        attributes as Todo rather than ORM instances.
+        """
+        dialect_name = session.bind.dialect.name
+        limit = filters.per_page
         
-        if filters.is_completed is not None:
-            conditions.append(Todo.is_completed == filters.is_completed)
+        if filters.cursor is not None:
+            if relations:
+                statement = lambda_stmt(lambda: select(Todo))
+                statement = _load_relations(statement, relations)
+            else:
+                statement = lambda_stmt(lambda: select(*_LIST_COLUMNS))
+            statement = _apply_filters(statement, dialect_name, owner_id, filters)
+            
+            # Seek past the cursor row on the (created_at, id) sort key instead of skipping rows,
+            # reading one extra row to learn whether another page follows
+            cursor_created_at, cursor_id = filters.cursor
+            fetch = limit + 1
+            statement += lambda s: s.where(or_(
+                Todo.created_at < cursor_created_at,
+                and_(Todo.created_at == cursor_created_at, Todo.id < cursor_id),
+            ))
+            statement += lambda s: s.order_by(Todo.created_at.desc(), Todo.id.desc()).limit(fetch)
+            
+            result = await session.exec(statement)
+            rows = (result.scalars() if relations else result).all()
+            total = await TodoService._count(session, owner_id, filters) if filters.include_total else None
+            return rows[:limit], total, len(rows) > limit
         
-        if filters.search:
-            search_term = f"%{filters.search}%"
-            conditions.append(
-                or_(
-                    Todo.title.contains(search_term.strip('%')),
-                    Todo.description.contains(search_term.strip('%'))
-                )
-            )
-        
-        if filters.due_before:
-            conditions.append(Todo.due_date <= filters.due_before)
-        
-        if filters.due_after:
-            conditions.append(Todo.due_date >= filters.due_after)
-        
-        # Apply all conditions
-        if conditions:
-            statement = statement.where(and_(*conditions))
-            count_statement = count_statement.where(and_(*conditions))
-        
-        # Get total count
-        total = session.exec(count_statement).one()
+        # Rows plus a window count over every row matching the filters
+        if relations:
+            statement = lambda_stmt(lambda: select(Todo, func.count().over().label("total")))
+            statement = _load_relations(statement, relations)
+        else:
+            # Just the rendered columns: no instance construction or identity-map bookkeeping
+            statement = lambda_stmt(lambda: select(*_LIST_COLUMNS, func.count().over().label("total")))
+        statement = _apply_filters(statement, dialect_name, owner_id, filters)
         
         # Apply pagination and ordering
-        statement = statement.order_by(Todo.created_at.desc())
-        statement = statement.offset((filters.page - 1) * filters.per_page)
-        statement = statement.limit(filters.per_page)
+        offset = (filters.page - 1) * limit
+        statement += lambda s: s.order_by(Todo.created_at.desc(), Todo.id.desc()).offset(offset).limit(limit)
         
-        todos = session.exec(statement).all()
-        return todos, total
+        rows = (await session.exec(statement)).all()
+        if rows:
+            total = rows[0].total
+        elif filters.page > 1:
+            # Past the last page no row carries the total, so count separately
+            total = await TodoService._count(session, owner_id, filters)
+        else:
+            total = 0
+        todos = [row.Todo for row in rows] if relations else rows
+        return todos, total, filters.page * limit < total
+    
+    @staticmethod
+    async def _count(session: AsyncSession, owner_id: UUID, filters: TodoFilterParams) -> int:
+        """Count the owner's todos matching the filters, ignoring pagination"""
+        statement = lambda_stmt(lambda: select(func.count(Todo.id)))
+        statement = _apply_filters(statement, session.bind.dialect.name, owner_id, filters)
+        return (await session.exec(statement)).scalar_one()
     
     @staticmethod
-    def update_todo(
-        session: Session, 
+    async def update_todo(
+        session: AsyncSession, 
         todo_id: UUID, 
         owner_id: UUID, 
         todo_update: TodoUpdate
     ) -> Optional[Todo]:
         """Update todo"""
-        todo = TodoService.get_todo_by_id(session, todo_id, owner_id)
-        if not todo:
-            return None
-        
-        # Update fields
-        update_data = todo_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(todo, field, value)
+        values = todo_update.model_dump(exclude_unset=True)
+        if not values:
+            return await TodoService.get_todo_by_id(session, todo_id, owner_id)
         
         # Auto-update status based on is_completed
-        if 'is_completed' in update_data:
-            if update_data['is_completed']:
-                todo.status = TodoStatus.COMPLETED
-            elif todo.status == TodoStatus.COMPLETED:
-                todo.status = TodoStatus.PENDING
+        if 'is_completed' in values:
+            if values['is_completed']:
+                values['status'] = TodoStatus.COMPLETED
+            elif 'status' in values:
+                if values['status'] == TodoStatus.COMPLETED:
+                    values['status'] = TodoStatus.PENDING
+            else:
+                # Reopen completed todos; leave any other stored status alone
+                values['status'] = case(
+                    (Todo.status == TodoStatus.COMPLETED, literal(TodoStatus.PENDING, Todo.status.type)),
+                    else_=Todo.status
+                )
         
-        todo.updated_at = datetime.utcnow()
-        session.add(todo)
-        session.commit()
-        session.refresh(todo)
+        # One UPDATE ... RETURNING instead of SELECT, attribute writes and a refetch
+        statement = (
+            update(Todo)
+            .where(and_(Todo.id == todo_id, Todo.owner_id == owner_id))
+            .values(**values)
+            .returning(Todo)
+        )
+        todo = (await session.exec(statement)).scalar_one_or_none()
+        if todo is None:
+            await session.rollback()
+            return None
+        
+        await _bump_todos_version(session, owner_id)
+        await session.commit()
         return todo
     
     @staticmethod
-    def delete_todo(session: Session, todo_id: UUID, owner_id: UUID) -> bool:
+    async def delete_todo(session: AsyncSession, todo_id: UUID, owner_id: UUID) -> bool:
         """Delete todo"""
-        todo = TodoService.get_todo_by_id(session, todo_id, owner_id)
+        todo = await TodoService.get_todo_by_id(session, todo_id, owner_id)
         if not todo:
             return False
         
-        session.delete(todo)
-        session.commit()
+        await session.delete(todo)
+        await _bump_todos_version(session, owner_id)
+        await session.commit()
         return True
     
     @staticmethod
-    def mark_todo_completed(session: Session, todo_id: UUID, owner_id: UUID) -> Optional[Todo]:
+    async def mark_todo_completed(session: AsyncSession, todo_id: UUID, owner_id: UUID) -> Optional[Todo]:
         """Mark todo as completed"""
-        todo = TodoService.get_todo_by_id(session, todo_id, owner_id)
+        todo = await TodoService.get_todo_by_id(session, todo_id, owner_id)
         if not todo:
             return None
         
         todo.is_completed = True
         todo.status = TodoStatus.COMPLETED
-        todo.updated_at = datetime.utcnow()
         
         session.add(todo)
-        session.commit()
-        session.refresh(todo)
+        await _bump_todos_version(session, owner_id)
+        await session.commit()
         return todo
     
     @staticmethod
-    def mark_todo_pending(session: Session, todo_id: UUID, owner_id: UUID) -> Optional[Todo]:
+    async def mark_todo_pending(session: AsyncSession, todo_id: UUID, owner_id: UUID) -> Optional[Todo]:
         """Mark todo as pending"""
-        todo = TodoService.get_todo_by_id(session, todo_id, owner_id)
+        todo = await TodoService.get_todo_by_id(session, todo_id, owner_id)
         if not todo:
             return None
         
         todo.is_completed = False
         todo.status = TodoStatus.PENDING
-        todo.updated_at = datetime.utcnow()
         
         session.add(todo)
-        session.commit()
-        session.refresh(todo)
+        await _bump_todos_version(session, owner_id)
+        await session.commit()
         return todo
     
     @staticmethod
-    def get_user_todo_stats(session: Session, owner_id: UUID) -> TodoStatsResponse:
-        """Get user's todo statistics"""
-        # Total todos
-        total_todos = session.exec(
-            select(func.count(Todo.id)).where(Todo.owner_id == owner_id)
-        ).one()
+    async def get_todos_version(session: AsyncSession, owner_id: UUID) -> int:
+        """Get the counter bumped on every write to the user's todos"""
+        statement = lambda_stmt(lambda: select(User.todos_version).where(User.id == owner_id))
+        return (await session.exec(statement)).scalar_one()
+    
+    @staticmethod
+    async def get_user_todo_stats(
+        session: AsyncSession,
+        owner_id: UUID,
+        version: Optional[int] = None
+    ) -> TodoStatsResponse:
+        """Get user's todo statistics, served from cache while the todos are unchanged"""
+        if version is None:
+            version = await TodoService.get_todos_version(session, owner_id)
+        cached = _stats_cache.get(owner_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
         
-        # Completed todos
-        completed_todos = session.exec(
-            select(func.count(Todo.id)).where(
-                and_(Todo.owner_id == owner_id, Todo.is_completed == True)
-            )
-        ).one()
+        stats = await TodoService._compute_user_todo_stats(session, owner_id)
+        _stats_cache[owner_id] = (version, stats)
+        return stats
+    
+    @staticmethod
+    async def _compute_user_todo_stats(session: AsyncSession, owner_id: UUID) -> TodoStatsResponse:
+        """Aggregate the user's todo statistics"""
+        now = datetime.utcnow()
         
-        # Pending todos
-        pending_todos = session.exec(
-            select(func.count(Todo.id)).where(
-                and_(Todo.owner_id == owner_id, Todo.is_completed == False)
-            )
-        ).one()
+        # Headline counts as conditional aggregates over one scan
+        # (overdue only counts todos that have due dates)
+        headline_statement = select(
+            func.count(Todo.id),
+            func.sum(case((Todo.is_completed == True, 1), else_=0)),
+            func.sum(case((
+                and_(Todo.due_date != None, Todo.due_date < now, Todo.is_completed == False), 1
+            ), else_=0)),
+        ).where(Todo.owner_id == owner_id)
+        priority_statement = (
+            select(Todo.priority, func.count(Todo.id))
+            .where(Todo.owner_id == owner_id)
+            .group_by(Todo.priority)
+        )
+        status_statement = (
+            select(Todo.status, func.count(Todo.id))
+            .where(Todo.owner_id == owner_id)
+            .group_by(Todo.status)
+        )
         
-        # Overdue todos (only count todos that have due dates)
-        now = datetime.utcnow()
-        overdue_todos = session.exec(
-            select(func.count(Todo.id)).where(
-                and_(
-                    Todo.owner_id == owner_id,
-                    Todo.due_date != None,
-                    Todo.due_date < now,
-                    Todo.is_completed == False
-                )
-            )
-        ).one()
+        # Run back to back on the request session; a request never checks out a second
+        # pool connection while holding one
+        total_todos, completed_todos, overdue_todos = (await session.exec(headline_statement)).one()
+        priority_rows = (await session.exec(priority_statement)).all()
+        status_rows = (await session.exec(status_statement)).all()
+        completed_todos = completed_todos or 0
+        overdue_todos = overdue_todos or 0
+        pending_todos = total_todos - completed_todos
         
         # Todos by priority
-        priority_stats = {}
-        for priority in TodoPriority:
-            count = session.exec(
-                select(func.count(Todo.id)).where(
-                    and_(Todo.owner_id == owner_id, Todo.priority == priority)
-                )
-            ).one()
+        priority_stats = {priority.value: 0 for priority in TodoPriority}
+        for priority, count in priority_rows:
             priority_stats[priority.value] = count
         
         # Todos by status
-        status_stats = {}
-        for status in TodoStatus:
-            count = session.exec(
-                select(func.count(Todo.id)).where(
-                    and_(Todo.owner_id == owner_id, Todo.status == status)
-                )
-            ).one()
+        status_stats = {status.value: 0 for status in TodoStatus}
+        for status, count in status_rows:
             status_stats[status.value] = count
         
         return TodoStatsResponse(
@@ -223,27 +361,37 @@ class TodoService:
         )
     
     @staticmethod
-    def get_overdue_todos(session: Session, owner_id: UUID) -> List[Todo]:
+    async def get_overdue_todos(
+        session: AsyncSession,
+        owner_id: UUID,
+        relations: Sequence[str] = TodoResponse.eager_relations
+    ) -> List[Todo]:
         """Get overdue todos for a user"""
         now = datetime.utcnow()
-        statement = select(Todo).where(
+        statement = lambda_stmt(lambda: select(Todo).where(
             and_(
                 Todo.owner_id == owner_id,
                 Todo.due_date != None,
                 Todo.due_date < now,
                 Todo.is_completed == False
             )
-        ).order_by(Todo.due_date.asc())
+        ).order_by(Todo.due_date.asc()))
+        statement = _load_relations(statement, relations)
         
-        return session.exec(statement).all()
+        return (await session.exec(statement)).scalars().all()
     
     @staticmethod
-    def get_todos_due_soon(session: Session, owner_id: UUID, hours: int = 24) -> List[Todo]:
+    async def get_todos_due_soon(
+        session: AsyncSession,
+        owner_id: UUID,
+        hours: int = 24,
+        relations: Sequence[str] = TodoResponse.eager_relations
+    ) -> List[Todo]:
         """Get todos due within specified hours"""
         now = datetime.utcnow()
         due_before = now + timedelta(hours=hours)
         
-        statement = select(Todo).where(
+        statement = lambda_stmt(lambda: select(Todo).where(
             and_(
                 Todo.owner_id == owner_id,
                 Todo.due_date != None,
@@ -251,6 +399,7 @@ class TodoService:
                 Todo.due_date <= due_before,
                 Todo.is_completed == False
             )
-        ).order_by(Todo.due_date.asc())
+        ).order_by(Todo.due_date.asc()))
+        statement = _load_relations(statement, relations)
         
-        return session.exec(statement).all()
+        return (await session.exec(statement)).scalars().all()
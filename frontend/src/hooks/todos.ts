@@ -95,6 +95,13 @@ export const useTodoStats = () => {
   });
 };
 
+export const useDashboard = (hours = 24) => {
+  return useQuery({
+    queryKey: ["todos", "dashboard", hours],
+    queryFn: () => todoApi.getDashboard(hours),
+  });
+};
+
 export const useOverdueTodos = () => {
   return useQuery({
     queryKey: ["todos", "overdue"],
@@ -13,6 +13,7 @@ import type {
   TodoListResponse,
   TodoFilterParams,
   TodoStatsResponse,
+  TodoDashboardResponse,
 } from '@/lib/types';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
@@ -128,6 +129,13 @@ export const todoApi = {
     return response.data;
   },
 
+  getDashboard: async (hours = 24): Promise<TodoDashboardResponse> => {
+    const response = await api.get('/todos/dashboard', {
+      params: { hours },
+    });
+    return response.data;
+  },
+
   getOverdue: async (): Promise<Todo[]> => {
     const response = await api.get('/todos/overdue');
     return response.data;
@@ -88,6 +88,7 @@ export interface TodoListResponse {
   per_page: number;
   has_next: boolean;
   has_prev: boolean;
+  next_cursor: string | null;
 }
 
 export interface TodoFilterParams {
@@ -99,6 +100,7 @@ export interface TodoFilterParams {
   due_after?: string;
   page?: number;
   per_page?: number;
+  cursor?: string;
 }
 
 export interface TodoStatsResponse {
@@ -108,4 +110,10 @@ export interface TodoStatsResponse {
   overdue_todos: number;
   todos_by_priority: Record<string, number>;
   todos_by_status: Record<string, number>;
+}
+
+export interface TodoDashboardResponse {
+  stats: TodoStatsResponse;
+  overdue: Todo[];
+  due_soon: Todo[];
 } 
\ No newline at end of file
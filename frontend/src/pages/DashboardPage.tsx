@@ -1,6 +1,6 @@
 import { useState } from 'react';
 import { Link } from 'react-router-dom';
-import { useTodos, useTodoStats, useOverdueTodos, useDueSoonTodos } from '@/hooks/todos';
+import { useTodos, useDashboard } from '@/hooks/todos';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Skeleton } from '@/components/ui/skeleton';
@@ -20,10 +20,11 @@ export function DashboardPage() {
   const [createDialogOpen, setCreateDialogOpen] = useState(false);
   const [editingTodo, setEditingTodo] = useState<Todo | null>(null);
 
-  const { data: stats, isLoading: statsLoading } = useTodoStats();
+  const { data: dashboard, isLoading: dashboardLoading } = useDashboard();
   const { data: recentTodos, isLoading: todosLoading } = useTodos({ per_page: 6 });
-  const { data: overdueTodos, isLoading: overdueLoading } = useOverdueTodos();
-  const { data: dueSoonTodos, isLoading: dueSoonLoading } = useDueSoonTodos();
+  const stats = dashboard?.stats;
+  const overdueTodos = dashboard?.overdue;
+  const dueSoonTodos = dashboard?.due_soon;
 
   const handleEditTodo = (todo: Todo) => {
     setEditingTodo(todo);
@@ -35,7 +36,7 @@ export function DashboardPage() {
     setEditingTodo(null);
   };
 
-  if (statsLoading) {
+  if (dashboardLoading) {
     return (
       <div className="space-y-6">
         <div className="flex items-center justify-between">
@@ -155,7 +156,7 @@ export function DashboardPage() {
             </div>
           </CardHeader>
           <CardContent>
-            {overdueLoading ? (
+            {dashboardLoading ? (
               <div className="space-y-3">
                 {Array.from({ length: 3 }).map((_, i) => (
                   <Skeleton key={i} className="h-20" />
@@ -202,7 +203,7 @@ export function DashboardPage() {
             </div>
           </CardHeader>
           <CardContent>
-            {dueSoonLoading ? (
+            {dashboardLoading ? (
               <div className="space-y-3">
                 {Array.from({ length: 3 }).map((_, i) => (
                   <Skeleton key={i} className="h-20" />